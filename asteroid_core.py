@@ -0,0 +1,254 @@
+"""Shared data layer and styling for the NASA Asteroid Dashboard."""
+import streamlit as st
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import awswrangler as wr
+import boto3
+import math
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+# Dark space theme
+DARK_THEME_CSS = """
+<style>
+    @import url('https://fonts.googleapis.com/css2?family=Space+Mono:wght@400;700&display=swap');
+    
+    .main-header {
+        font-size: 3rem;
+        color: #7b68ee;
+        text-align: center;
+        margin-bottom: 2rem;
+    }
+    .stApp {
+        background: linear-gradient(180deg, #0d1117 0%, #161b22 50%, #0d1117 100%);
+    }
+    .stMetric {
+        background: linear-gradient(135deg, #1a1f35 0%, #2d2b55 100%);
+        padding: 1rem;
+        border-radius: 10px;
+        border: 1px solid #7b68ee33;
+    }
+    [data-testid="stMetricLabel"] {
+        color: #8b949e !important;
+        font-family: 'Space Mono', monospace !important;
+        text-transform: uppercase;
+        font-size: 0.75em !important;
+        letter-spacing: 1px;
+    }
+    [data-testid="stMetricValue"] {
+        color: #c9d1d9 !important;
+        font-family: 'Space Mono', monospace !important;
+    }
+    h1, h2, h3, .stSubheader {
+        color: #c9d1d9 !important;
+    }
+    [data-testid="stSidebar"] {
+        background: linear-gradient(180deg, #161b22 0%, #0d1117 100%);
+    }
+    [data-testid="stSidebar"] .stMarkdown {
+        color: #8b949e;
+    }
+</style>
+"""
+
+# Shared Plotly styling
+DARK_LAYOUT = dict(
+    plot_bgcolor='rgba(13, 17, 23, 0.8)',
+    paper_bgcolor='rgba(0,0,0,0)',
+    font_color='#c9d1d9',
+    legend=dict(font=dict(color='#c9d1d9'))
+)
+# Space-like purple-blue background
+SPACE_LAYOUT = dict(DARK_LAYOUT, plot_bgcolor='#1a1033')
+DARK_AXIS = dict(gridcolor='#30363d')
+SPACE_AXIS = dict(
+    gridcolor='#2d2455',
+    title_font=dict(color='#c9d1d9'),
+    zerolinecolor='#2d2455'
+)
+HAZARD_COLORS = {
+    'Safe': '#48bb78',
+    'Potentially Hazardous': '#fc8181'
+}
+DAILY_COLORSCALE = ['#4a5568', '#9f7aea', '#e53e3e']
+
+# Caches keyed on the filtered frame get one entry per filter state, and the
+# sliders are continuous, so they are capped to keep memory bounded
+FILTER_CACHE_ENTRIES = 32
+
+# Detailed table columns, closest approach first
+# Table columns and their user-facing labels, shared by the table and the CSV
+TABLE_LABELS = {
+    'name': 'Asteroid Name',
+    'close_approach_date': 'Approach Date',
+    'miss_distance_mkm': 'Miss Distance (M km)',
+    'velocity_km_s': 'Velocity (km/s)',
+    'is_potentially_hazardous': 'Potentially Hazardous',
+    'min_diameter_km': 'Min Diameter (km)',
+    'max_diameter_km': 'Max Diameter (km)'
+}
+TABLE_COLUMNS = list(TABLE_LABELS)
+
+# Arrow dtypes of the asteroid query. The CTAS (Parquet) and CSV result paths
+# type strings and REAL columns differently, so every result is cast to these
+ASTEROID_DTYPES = {
+    'id': pd.ArrowDtype(pa.string()),
+    'name': pd.ArrowDtype(pa.string()),
+    'close_approach_date': pd.ArrowDtype(pa.string()),
+    'miss_distance_km': pd.ArrowDtype(pa.float64()),
+    'velocity_km_s': pd.ArrowDtype(pa.float32()),
+    'is_potentially_hazardous': pd.ArrowDtype(pa.bool_()),
+    'min_diameter_km': pd.ArrowDtype(pa.float32()),
+    'max_diameter_km': pd.ArrowDtype(pa.float32())
+}
+
+def read_asteroids(date_filter, params, ctas_approach=True, **kwargs):
+    # Columns are typed in the query so the Parquet results already hold narrow dtypes
+    query = f"""
+        SELECT
+            id,
+            name,
+            close_approach_date,
+            CAST(miss_distance_km AS DOUBLE) AS miss_distance_km,
+            CAST(velocity_km_s AS REAL) AS velocity_km_s,
+            CAST(is_potentially_hazardous AS BOOLEAN) AS is_potentially_hazardous,
+            CAST(min_diameter_km AS REAL) AS min_diameter_km,
+            CAST(max_diameter_km AS REAL) AS max_diameter_km
+        FROM nasa_neo_database.asteroids
+        WHERE {date_filter}
+    """
+    # Large results are staged as Parquet via CTAS, small ones read from CSV
+    df = wr.athena.read_sql_query(
+        query,
+        database="nasa_neo_database",
+        ctas_approach=ctas_approach,
+        dtype_backend='pyarrow',
+        params=params,
+        s3_output="s3://nasa-asteroid-data-1/athena-results/",
+        boto3_session=boto3.Session(region_name="us-east-1"),
+        **kwargs
+    )
+    # Same dtypes on both paths, so base and delta concat without widening
+    return df.astype(ASTEROID_DTYPES)
+
+def week_window():
+    # Athena's current_date is UTC
+    utc_today = datetime.now(timezone.utc).date()
+    return (utc_today - timedelta(days=7)).isoformat(), utc_today.isoformat()
+
+# Past days no longer change, so the base window is cached for the whole day and
+# keyed on the dates only. Athena's result cache also lets a fresh process reuse
+# the staged Parquet.
+@st.cache_data(ttl=86400, max_entries=2)
+def load_asteroid_base(start_date, today):
+    try:
+        return read_asteroids(
+            "close_approach_date >= :start_date AND close_approach_date < :today",
+            {'start_date': start_date, 'today': today},
+            athena_cache_settings={'max_cache_seconds': 86400}
+        )
+    except wr.exceptions.EmptyDataFrame:
+        # A cache hit on a zero-row result has no temp table to type it from
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in ASTEROID_DTYPES.items()})
+
+# The hourly refresh only re-queries today's rows on top of the cached base
+@st.cache_data(ttl=3600, max_entries=2)
+def load_asteroid_delta(today):
+    # Only today's few rows, not worth staging through CTAS
+    return read_asteroids("close_approach_date >= :today", {'today': today}, ctas_approach=False)
+
+@st.cache_data(ttl=3600, max_entries=2)
+def load_asteroid_week(start_date, today):
+    df = pd.concat([load_asteroid_base(start_date, today), load_asteroid_delta(today)], ignore_index=True)
+    # Missing flags count as not hazardous. The flag is kept as a plain NumPy bool
+    # column so .to_numpy() hands out the mask without a conversion
+    df['is_potentially_hazardous'] = df['is_potentially_hazardous'].fillna(False).astype(bool)
+    df['close_approach_date'] = pd.to_datetime(df['close_approach_date']).astype('datetime64[ns]')
+    # Derived display column, computed once per cached load
+    df['miss_distance_mkm'] = (df['miss_distance_km'] * 1e-6).astype('float[pyarrow]')
+    # Remove duplicate entries (based on unique ID + date)
+    return df.drop_duplicates(subset=["id", "close_approach_date"], ignore_index=True)
+
+# Filters are applied in memory on the cached week, so changing them never
+# runs an Athena query
+@st.cache_data(ttl=3600, max_entries=FILTER_CACHE_ENTRIES)
+def load_asteroid_data(hazardous, dist_max_km, vmin, vmax):
+    df = load_asteroid_week(*week_window())
+    velocity = df['velocity_km_s'].to_numpy(dtype='float64', na_value=np.nan)
+    mask = (
+        (df['miss_distance_km'].to_numpy(dtype='float64', na_value=np.nan) <= dist_max_km)
+        & (velocity >= vmin)
+        & (velocity <= vmax)
+    )
+    if hazardous is not None:
+        mask &= df['is_potentially_hazardous'].to_numpy() == hazardous
+    return df[mask]
+
+# Past days' velocity range, cached with the base it is computed from
+@st.cache_data(ttl=86400, max_entries=2)
+def base_velocity_range(start_date, today):
+    velocity = load_asteroid_base(start_date, today)['velocity_km_s']
+    return velocity.min(), velocity.max()
+
+# Velocity slider bounds for the whole week, rounded once per cached load
+@st.cache_data(ttl=3600)
+def load_velocity_bounds():
+    start_date, today = week_window()
+    base_min, base_max = base_velocity_range(start_date, today)
+    today_velocity = load_asteroid_delta(today)['velocity_km_s']
+    # min/max skip NA, so an empty side drops out of the combined range
+    week_min = pd.Series([base_min, today_velocity.min()], dtype='Float64').min()
+    week_max = pd.Series([base_max, today_velocity.max()], dtype='Float64').max()
+    if pd.isna(week_min):
+        return {'vmin': 0.0, 'vmax': 100.0}
+    # Clean boundaries to two decimals, fix if they're too close
+    vmin = math.floor(week_min * 100) / 100
+    vmax = math.ceil(week_max * 100) / 100
+    # Guarantee a minimum visible range
+    if vmax - vmin < 0.01:
+        vmax = round(vmin + 0.01, 2)
+    return {'vmin': vmin, 'vmax': vmax}
+
+# Aggregations are memoized so reruns with unchanged filters skip them
+@st.cache_data(ttl=3600, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def daily_agg(df):
+    # Aggregate by date with bincount over integer date codes instead of a groupby
+    codes, dates = pd.factorize(df['close_approach_date'], sort=True)
+    count = np.bincount(codes)
+    hazardous = np.bincount(codes, weights=df['is_potentially_hazardous'].to_numpy()).astype(np.int64)
+    avg_distance = np.bincount(codes, weights=df['miss_distance_km'].to_numpy(dtype='float64')) / count
+    return pd.DataFrame({
+        'close_approach_date': dates,
+        'count': count,
+        'hazardous': hazardous,
+        'avg_distance': avg_distance,
+        'avg_distance_mkm': avg_distance / 1_000_000
+    })
+
+@st.cache_data(ttl=3600, max_entries=FILTER_CACHE_ENTRIES, show_spinner=False)
+def topn(df, n):
+    # Partial selection, no need to sort the whole frame for n <= 50 rows
+    return df.nlargest(n, "max_diameter_km")
+
+def threat_sample(df, max_points, n_extremes=200):
+    # Keep every hazardous asteroid plus the closest and fastest ones, and
+    # sample only the remaining rows to fill up to max_points
+    keep = df['is_potentially_hazardous'].to_numpy().copy()
+    k = min(n_extremes, len(df))
+    if k > 0:
+        keep[np.argpartition(df['miss_distance_km'].to_numpy(dtype='float64'), k - 1)[:k]] = True
+        keep[np.argpartition(-df['velocity_km_s'].to_numpy(dtype='float64'), k - 1)[:k]] = True
+    rest = np.flatnonzero(~keep)
+    n_sampled = min(max(max_points - int(keep.sum()), 0), len(rest))
+    sampled = np.random.default_rng(0).choice(rest, n_sampled, replace=False)
+    return df.iloc[np.sort(np.concatenate([np.flatnonzero(keep), sampled]))]
+
+# Keyed on the filter arguments rather than the frame so lookups skip hashing
+# it; each entry holds a whole encoded selection, hence the tighter cap
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def table_csv(hazardous, dist_max_km, vmin, vmax):
+    df = load_asteroid_data(hazardous, dist_max_km, vmin, vmax)
+    table_df = df.sort_values('miss_distance_km')[TABLE_COLUMNS].rename(columns=TABLE_LABELS)
+    return table_df.to_csv(index=False, date_format='%Y-%m-%d').encode()
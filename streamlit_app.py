@@ -1,11 +1,26 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from pyathena import connect
+import numpy as np
+import plotly.graph_objects as go
 import os
 from datetime import datetime
 from datetime import timedelta
-import math
+from asteroid_core import (
+    DARK_THEME_CSS,
+    DARK_LAYOUT,
+    SPACE_LAYOUT,
+    DARK_AXIS,
+    SPACE_AXIS,
+    HAZARD_COLORS,
+    DAILY_COLORSCALE,
+    TABLE_COLUMNS,
+    TABLE_LABELS,
+    load_velocity_bounds,
+    load_asteroid_data,
+    daily_agg,
+    topn,
+    threat_sample,
+    table_csv
+)
 
 # Set up AWS credentials from Streamlit secrets
 os.environ['AWS_ACCESS_KEY_ID'] = st.secrets['AWS_ACCESS_KEY_ID']
@@ -20,144 +35,69 @@ st.set_page_config(
 )
 
 # Dark space theme
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Space+Mono:wght@400;700&display=swap');
-    
-    .main-header {
-        font-size: 3rem;
-        color: #7b68ee;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .stApp {
-        background: linear-gradient(180deg, #0d1117 0%, #161b22 50%, #0d1117 100%);
-    }
-    .stMetric {
-        background: linear-gradient(135deg, #1a1f35 0%, #2d2b55 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        border: 1px solid #7b68ee33;
-    }
-    [data-testid="stMetricLabel"] {
-        color: #8b949e !important;
-        font-family: 'Space Mono', monospace !important;
-        text-transform: uppercase;
-        font-size: 0.75em !important;
-        letter-spacing: 1px;
-    }
-    [data-testid="stMetricValue"] {
-        color: #c9d1d9 !important;
-        font-family: 'Space Mono', monospace !important;
-    }
-    h1, h2, h3, .stSubheader {
-        color: #c9d1d9 !important;
-    }
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #161b22 0%, #0d1117 100%);
-    }
-    [data-testid="stSidebar"] .stMarkdown {
-        color: #8b949e;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
 
 st.markdown('<h1 class="main-header">NASA Asteroid Dashboard</h1>', unsafe_allow_html=True)
 st.markdown("---")
 
-@st.cache_data(ttl=3600)
-def load_asteroid_data():
-    conn = connect(
-        s3_staging_dir="s3://nasa-asteroid-data-1/athena-results/",
-        region_name="us-east-1"
-    )
-    query = """
-        SELECT
-            id,
-            name,
-            close_approach_date,
-            miss_distance_km,
-            velocity_km_s,
-            is_potentially_hazardous,
-            min_diameter_km,
-            max_diameter_km
-        FROM nasa_neo_database.asteroids
-        WHERE close_approach_date >= date_format(current_date - interval '7' day, '%Y-%m-%d')
-    """
-    return pd.read_sql(query, conn)
-
-df = load_asteroid_data()
-
-# Remove duplicate entries (based on unique ID + date)
-df = df.drop_duplicates(subset=["id", "close_approach_date"])
-
 # Sidebar filters
 st.sidebar.header("Filters")
-hazardous_filter = st.sidebar.selectbox(
-    "Asteroid Type",
-    ["All", "Potentially Hazardous", "Non-Hazardous"]
-)
+velocity_meta = load_velocity_bounds()
+slider_min, slider_max = velocity_meta['vmin'], velocity_meta['vmax']
 
-max_distance = st.sidebar.slider(
-    "Maximum Miss Distance (million km)",
-    min_value=0.0,
-    max_value=100.0,
-    value=80.0,
-    step=0.5
-)
+# Inside a form, so adjusting several filters triggers a single reload on submit
+with st.sidebar.form("filters"):
+    hazardous_filter = st.selectbox(
+        "Asteroid Type",
+        ["All", "Potentially Hazardous", "Non-Hazardous"]
+    )
 
-if len(df) > 0:
-    # Find true min/max velocities
-    velocity_min = float(df['velocity_km_s'].min())
-    velocity_max = float(df['velocity_km_s'].max())
-    # Clean boundaries to two decimals, fix if they're too close
-    slider_min = math.floor(velocity_min * 100) / 100
-    slider_max = math.ceil(velocity_max * 100) / 100
-    # Guarantee a minimum visible range
-    if slider_max - slider_min < 0.01:
-        slider_max = round(slider_min + 0.01, 2)
-else:
-    slider_min, slider_max = 0.0, 100.0
+    max_distance = st.slider(
+        "Maximum Miss Distance (million km)",
+        min_value=0.0,
+        max_value=100.0,
+        value=80.0,
+        step=0.5
+    )
 
-velocity_range = st.sidebar.slider(
-    "Velocity Range (km/s)",
-    min_value=slider_min,
-    max_value=slider_max,
-    value=(slider_min, slider_max),
-    step=0.01
-)
+    velocity_range = st.slider(
+        "Velocity Range (km/s)",
+        min_value=slider_min,
+        max_value=slider_max,
+        value=(slider_min, slider_max),
+        step=0.01
+    )
 
-# User input: Select top N largest asteroids for bar chart
-top_n = st.sidebar.number_input(
-    "Show Top N Largest Asteroids",
-    min_value=1, max_value=50, value=10, step=1
-)
+    st.form_submit_button("Apply Filters")
 
-# Apply filters
-filtered_df = df.copy()
-if hazardous_filter == "Potentially Hazardous":
-    filtered_df = filtered_df[filtered_df['is_potentially_hazardous'] == True]
-elif hazardous_filter == "Non-Hazardous":
-    filtered_df = filtered_df[filtered_df['is_potentially_hazardous'] == False]
+# Apply filters (evaluated by Athena)
+hazardous_values = {
+    "All": None,
+    "Potentially Hazardous": True,
+    "Non-Hazardous": False
+}
+filter_args = (
+    hazardous_values[hazardous_filter],
+    max_distance * 1_000_000,
+    velocity_range[0],
+    velocity_range[1]
+)
+filtered_df = load_asteroid_data(*filter_args)
 
-filtered_df = filtered_df[filtered_df['miss_distance_km'] <= max_distance * 1_000_000]
-filtered_df = filtered_df[
-    (filtered_df['velocity_km_s'] >= velocity_range[0]) &
-    (filtered_df['velocity_km_s'] <= velocity_range[1])
-]
+total_count = len(filtered_df)
 
 # Metrics row
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("Total Asteroids", len(filtered_df))
+    st.metric("Total Asteroids", total_count)
 with col2:
-    hazardous_count = len(filtered_df[filtered_df['is_potentially_hazardous'] == True])
+    hazardous_count = int(filtered_df['is_potentially_hazardous'].to_numpy().sum())
     st.metric("Potentially Hazardous", hazardous_count)
 with col3:
-    closest = filtered_df['miss_distance_km'].min() if len(filtered_df) > 0 else 0
+    closest = filtered_df['miss_distance_km'].min() if total_count > 0 else 0
     st.metric("Closest Approach", f"{closest/1_000_000:.2f}M km" if closest > 0 else "N/A")
 with col4:
-    avg_velocity = filtered_df['velocity_km_s'].mean() if len(filtered_df) > 0 else 0
+    avg_velocity = filtered_df['velocity_km_s'].mean() if total_count > 0 else 0
     st.metric("Avg Velocity", f"{avg_velocity:.1f} km/s")
 
 st.markdown("---")
@@ -167,176 +107,198 @@ col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("Daily Asteroid Approaches")
-    if len(filtered_df) > 0:
-        # Aggregate by date
-        daily_counts = (
-            filtered_df.groupby('close_approach_date')
-            .agg(
-                count=('id', 'size'),
-                hazardous=('is_potentially_hazardous', 'sum'),
-                avg_distance=('miss_distance_km', 'mean')
+    if total_count > 0:
+        daily_counts = daily_agg(filtered_df)
+
+        fig = go.Figure(go.Bar(
+            x=daily_counts['close_approach_date'].to_numpy(),
+            y=daily_counts['count'].to_numpy(),
+            customdata=daily_counts[['hazardous', 'avg_distance_mkm']].to_numpy(),
+            marker=dict(
+                color=daily_counts['hazardous'].to_numpy(),
+                colorscale=DAILY_COLORSCALE,
+                colorbar=dict(title='Hazardous Count')
+            ),
+            hovertemplate=(
+                'Date=%{x}<br>'
+                'Number of Asteroids=%{y}<br>'
+                'Hazardous Count=%{customdata[0]}<br>'
+                'Avg Distance (M km)=%{customdata[1]:.2f}<extra></extra>'
             )
-            .reset_index()
-        )
-        daily_counts['avg_distance_mkm'] = daily_counts['avg_distance'] / 1_000_000
-        
-        fig = px.bar(
-            daily_counts,
-            x='close_approach_date',
-            y='count',
-            color='hazardous',
-            color_continuous_scale=['#4a5568', '#9f7aea', '#e53e3e'],
-            hover_data={'avg_distance_mkm': ':.2f'},
-            labels={
-                'close_approach_date': 'Date',
-                'count': 'Number of Asteroids',
-                'hazardous': 'Hazardous Count',
-                'avg_distance_mkm': 'Avg Distance (M km)'
-            }
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(13, 17, 23, 0.8)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#c9d1d9',
-            xaxis=dict(gridcolor='#30363d'),
-            yaxis=dict(gridcolor='#30363d')
-        )
+        ))
+        fig.update_layout(**DARK_LAYOUT)
+        fig.update_xaxes(DARK_AXIS, title_text='Date')
+        fig.update_yaxes(DARK_AXIS, title_text='Number of Asteroids')
         st.plotly_chart(fig, use_container_width=True)
         st.caption("Number of near-Earth objects passing by each day, colored by hazard level.")
 
 with col2:
     st.subheader("Risk Assessment")
-    if len(filtered_df) > 0:
-        hazard_labels = {True: "Potentially Hazardous", False: "Safe"}
-        hazard_vals = filtered_df['is_potentially_hazardous'].map(hazard_labels).value_counts()
-        fig = px.pie(
-            values=hazard_vals.values,
-            names=hazard_vals.index,
-            color=hazard_vals.index,
-            color_discrete_map={
-                'Safe': '#48bb78',
-                'Potentially Hazardous': '#fc8181'
-            },
-            hole=0.4
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='#c9d1d9',
-            legend=dict(font=dict(color='#c9d1d9'))
-        )
-        fig.update_traces(textfont_color='#c9d1d9')
+    if total_count > 0:
+        # Slice sizes come from the hazardous count in the metrics row
+        labels = np.array(['Safe', 'Potentially Hazardous'])
+        counts = np.array([total_count - hazardous_count, hazardous_count])
+        labels, counts = labels[counts > 0], counts[counts > 0]
+        fig = go.Figure(go.Pie(
+            labels=labels,
+            values=counts,
+            marker=dict(colors=[HAZARD_COLORS[label] for label in labels]),
+            hole=0.4,
+            textfont_color='#c9d1d9'
+        ))
+        fig.update_layout(**DARK_LAYOUT)
         st.plotly_chart(fig, use_container_width=True)
         st.caption("Proportion of potentially hazardous asteroids in the current selection.")
 
 st.markdown("---")
 
 # Scatter plot: Velocity vs Distance (size = diameter)
+# Cap on points sent to the browser; beyond this the low-threat rows are sampled
+SCATTER_MAX_POINTS = 2000
+
 st.subheader("Asteroid Threat Profile")
-if len(filtered_df) > 0:
-    scatter_df = filtered_df.copy()
-    scatter_df['miss_distance_mkm'] = scatter_df['miss_distance_km'] / 1_000_000
+if total_count > 0:
+    scatter_df = filtered_df
+    if len(scatter_df) > SCATTER_MAX_POINTS:
+        scatter_df = threat_sample(scatter_df, SCATTER_MAX_POINTS)
     
-    fig = px.scatter(
-        scatter_df,
-        x='miss_distance_mkm',
-        y='velocity_km_s',
-        size='max_diameter_km',
-        color='is_potentially_hazardous',
-        color_discrete_map={False: '#48bb78', True: '#fc8181'},
-        hover_name='name',
-        hover_data={
-            'miss_distance_mkm': ':.2f',
-            'velocity_km_s': ':.2f',
-            'max_diameter_km': ':.3f',
-            'is_potentially_hazardous': False
-        },
-        labels={
-            'miss_distance_mkm': 'Miss Distance (Million km)',
-            'velocity_km_s': 'Velocity (km/s)',
-            'max_diameter_km': 'Diameter (km)',
-            'is_potentially_hazardous': 'Hazardous'
-        }
-    )
-    # Space-like purple-blue background
-    fig.update_layout(
-        plot_bgcolor='#1a1033',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='#c9d1d9',
-        xaxis=dict(
-            gridcolor='#2d2455',
-            title_font=dict(color='#c9d1d9'),
-            zerolinecolor='#2d2455'
-        ),
-        yaxis=dict(
-            gridcolor='#2d2455',
-            title_font=dict(color='#c9d1d9'),
-            zerolinecolor='#2d2455'
-        ),
-        legend=dict(font=dict(color='#c9d1d9'))
-    )
-    fig.update_traces(marker=dict(line=dict(width=1, color='#2d2455')))
+    # Marker area scales with diameter, largest marker is 20px across (px's size_max)
+    sizeref = scatter_df['max_diameter_km'].max() / 20 ** 2
+    # Arrow-backed columns are handed to Plotly as plain NumPy arrays
+    hazardous_mask = scatter_df['is_potentially_hazardous'].to_numpy()
+    fig = go.Figure()
+    for hazardous, color in ((False, HAZARD_COLORS['Safe']), (True, HAZARD_COLORS['Potentially Hazardous'])):
+        group = scatter_df[hazardous_mask if hazardous else ~hazardous_mask]
+        if len(group) == 0:
+            continue
+        # WebGL trace so the GPU rasterizes the markers
+        fig.add_trace(go.Scattergl(
+            x=group['miss_distance_mkm'].to_numpy(dtype='float32'),
+            y=group['velocity_km_s'].to_numpy(dtype='float32'),
+            mode='markers',
+            name=str(hazardous),
+            hovertext=group['name'].to_numpy(),
+            customdata=group['max_diameter_km'].to_numpy(dtype='float32'),
+            marker=dict(
+                color=color,
+                size=group['max_diameter_km'].to_numpy(dtype='float32'),
+                sizemode='area',
+                sizeref=sizeref,
+                line=dict(width=1, color='#2d2455')
+            ),
+            hovertemplate=(
+                '<b>%{hovertext}</b><br><br>'
+                'Miss Distance (Million km)=%{x:.2f}<br>'
+                'Velocity (km/s)=%{y:.2f}<br>'
+                'Diameter (km)=%{customdata:.3f}<extra></extra>'
+            )
+        ))
+    fig.update_layout(**SPACE_LAYOUT)
+    fig.update_layout(legend_title_text='Hazardous')
+    fig.update_xaxes(SPACE_AXIS, title_text='Miss Distance (Million km)')
+    fig.update_yaxes(SPACE_AXIS, title_text='Velocity (km/s)')
     st.plotly_chart(fig, use_container_width=True)
     st.caption("Each point is an asteroid. Size represents diameter, position shows velocity and proximity. Top-left = higher threat.")
+    if len(scatter_df) < total_count:
+        st.caption(
+            f"Showing {len(scatter_df):,} of {total_count:,} asteroids: every hazardous, closest and "
+            "fastest asteroid, plus a random sample of the rest."
+        )
 
 st.markdown("---")
 
 # Top N largest asteroids bar chart
-st.subheader(f"Top {top_n} Largest Asteroids")
-if len(filtered_df) > 0:
-    topn_df = (
-        filtered_df.sort_values("max_diameter_km", ascending=False)
-        .head(top_n)
-        .copy()
-    )
-    # Add velocity for extra context
-    topn_df['velocity_display'] = topn_df['velocity_km_s'].round(2)
-    
-    fig = px.bar(
-        topn_df[::-1],  # reverse for largest on top
-        x="max_diameter_km",
-        y="name",
-        orientation="h",
-        color="is_potentially_hazardous",
-        color_discrete_map={False: '#48bb78', True: '#fc8181'},
-        hover_data=['velocity_display', 'miss_distance_km'],
-        labels={
-            "max_diameter_km": "Max Diameter (km)",
-            "name": "Asteroid Name",
-            "is_potentially_hazardous": "Hazardous",
-            "velocity_display": "Velocity (km/s)",
-            "miss_distance_km": "Miss Distance (km)"
-        }
+# Runs as a fragment so changing N only rebuilds this chart
+@st.fragment
+def render_topn(df):
+    header = st.empty()
+    # User input: Select top N largest asteroids for bar chart
+    # (fragments cannot write to the sidebar, so the input sits with its chart)
+    top_n = st.number_input(
+        "Show Top N Largest Asteroids",
+        min_value=1, max_value=50, value=10, step=1
     )
-    fig.update_layout(
-        yaxis=dict(tickfont=dict(size=11, color='#c9d1d9')),
-        plot_bgcolor='rgba(13, 17, 23, 0.8)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font_color='#c9d1d9',
-        xaxis=dict(gridcolor='#30363d'),
-        legend=dict(font=dict(color='#c9d1d9'))
-    )
-    st.plotly_chart(fig, use_container_width=True)
-    st.caption("Ranked by maximum estimated diameter. Larger asteroids pose greater potential impact risk.")
+    header.subheader(f"Top {top_n} Largest Asteroids")
+    if len(df) > 0:
+        topn_df = topn(df, top_n)
+
+        bar_df = topn_df.iloc[::-1]  # reverse for largest on top
+        bar_hazardous = bar_df['is_potentially_hazardous'].to_numpy()
+        # Single trace colored per bar keeps the size ranking on the y axis
+        fig = go.Figure(go.Bar(
+            x=bar_df['max_diameter_km'].to_numpy(dtype='float32'),
+            y=bar_df['name'].to_numpy(),
+            orientation='h',
+            showlegend=False,
+            marker_color=np.where(
+                bar_hazardous,
+                HAZARD_COLORS['Potentially Hazardous'],
+                HAZARD_COLORS['Safe']
+            ),
+            hovertext=np.where(bar_hazardous, 'True', 'False'),
+            # Add velocity for extra context
+            customdata=bar_df[['velocity_km_s', 'miss_distance_km']].to_numpy(dtype='float64'),
+            hovertemplate=(
+                'Max Diameter (km)=%{x}<br>'
+                'Asteroid Name=%{y}<br>'
+                'Hazardous=%{hovertext}<br>'
+                'Velocity (km/s)=%{customdata[0]:.2f}<br>'
+                'Miss Distance (km)=%{customdata[1]}<extra></extra>'
+            )
+        ))
+        # Legend-only entries give the per-bar colors a key
+        for hazardous, label in ((False, 'Safe'), (True, 'Potentially Hazardous')):
+            fig.add_trace(go.Scatter(
+                x=[None],
+                y=[None],
+                mode='markers',
+                name=str(hazardous),
+                marker=dict(symbol='square', size=12, color=HAZARD_COLORS[label])
+            ))
+        fig.update_layout(**DARK_LAYOUT)
+        fig.update_layout(legend_title_text='Hazardous')
+        fig.update_xaxes(DARK_AXIS, title_text='Max Diameter (km)')
+        fig.update_yaxes(title_text='Asteroid Name', tickfont=dict(size=11, color='#c9d1d9'))
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Ranked by maximum estimated diameter. Larger asteroids pose greater potential impact risk.")
+
+render_topn(filtered_df)
 
 # Data table
+# Rows rendered in the browser; the full selection is offered as a CSV download
+TABLE_MAX_ROWS = 500
+
 st.subheader("Detailed Asteroid Data")
-if len(filtered_df) > 0:
-    display_df = filtered_df.sort_values('miss_distance_km').copy()
-    display_df['Miss Distance (M km)'] = (display_df['miss_distance_km'] / 1_000_000).round(2)
-    display_df['Potentially Hazardous'] = display_df['is_potentially_hazardous'].map({True: 'Yes', False: 'No'})
+if total_count > 0:
+    display_df = filtered_df.nsmallest(TABLE_MAX_ROWS, 'miss_distance_km')[TABLE_COLUMNS]
     st.dataframe(
-        display_df[['name', 'close_approach_date', 'Miss Distance (M km)',
-                    'velocity_km_s', 'Potentially Hazardous', 'min_diameter_km', 'max_diameter_km']].rename(columns={
-            'name': 'Asteroid Name',
-            'close_approach_date': 'Approach Date',
-            'velocity_km_s': 'Velocity (km/s)',
-            'min_diameter_km': 'Min Diameter (km)',
-            'max_diameter_km': 'Max Diameter (km)'
-        }),
+        display_df,
+        column_config={
+            'name': TABLE_LABELS['name'],
+            'close_approach_date': st.column_config.DateColumn(TABLE_LABELS['close_approach_date'], format='YYYY-MM-DD'),
+            'miss_distance_mkm': st.column_config.NumberColumn(TABLE_LABELS['miss_distance_mkm'], format='%.2f'),
+            'velocity_km_s': st.column_config.NumberColumn(TABLE_LABELS['velocity_km_s'], format='%.2f'),
+            'is_potentially_hazardous': st.column_config.CheckboxColumn(TABLE_LABELS['is_potentially_hazardous']),
+            'min_diameter_km': st.column_config.NumberColumn(TABLE_LABELS['min_diameter_km'], format='%.3f'),
+            'max_diameter_km': st.column_config.NumberColumn(TABLE_LABELS['max_diameter_km'], format='%.3f')
+        },
+        hide_index=True,
         use_container_width=True
     )
-    st.caption("Full dataset sorted by closest approach distance. Click column headers to sort.")
+    if total_count > TABLE_MAX_ROWS:
+        st.caption(f"Showing the {TABLE_MAX_ROWS:,} closest of {total_count:,} asteroids. Download the CSV for the full selection.")
+    else:
+        st.caption("Full dataset sorted by closest approach distance. Click column headers to sort.")
+    # Build the CSV only when asked for, and only for the filters it was asked with
+    if st.button("Prepare full CSV"):
+        st.session_state['csv_filters'] = filter_args
+    if st.session_state.get('csv_filters') == filter_args:
+        st.download_button(
+            "Download full CSV",
+            table_csv(*filter_args),
+            file_name="asteroids.csv",
+            mime="text/csv"
+        )
 
 # Footer with data refresh time
 @st.cache_data(ttl=3600)